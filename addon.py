@@ -1,11 +1,13 @@
 # mitmproxy_token_proxy/addon.py
-from mitmproxy import http
+from mitmproxy import command, http
 import json
 import logging
+import time
 from threading import Lock
 from logger_setup import setup_logging
 from config import *
 from replacer import rewrite_url_func, process_and_rewrite_response
+from skip_policy import RouteSkipPolicy
 
 setup_logging()
 logger = logging.getLogger(__name__)
@@ -25,6 +27,58 @@ def host_matches_any(host: str, domain_list):
 
 class TokenProxyAddon:
 
+    def __init__(self, skip_policy: RouteSkipPolicy = None, state_file: str = SKIP_POLICY_STATE_FILE):
+        # 按路由学习替换结果，长期零替换的路由直接放行
+        self.skip_policy = skip_policy or RouteSkipPolicy(
+            threshold=SKIP_POLICY_THRESHOLD,
+            resample_every=SKIP_POLICY_RESAMPLE_EVERY,
+            max_routes=SKIP_POLICY_MAX_ROUTES,
+            path_depth=SKIP_POLICY_PATH_DEPTH,
+        )
+        self.state_file = state_file
+        self._last_save = time.monotonic()
+        if self.state_file and self.skip_policy.load(self.state_file):
+            logger.info(f"[SKIP-POLICY] loaded {len(self.skip_policy.snapshot())} routes from {self.state_file}")
+
+    def save_skip_policy(self):
+        if not self.state_file:
+            return
+        try:
+            self.skip_policy.save(self.state_file)
+        except OSError:
+            logger.exception("[SKIP-POLICY] failed to save state")
+        self._last_save = time.monotonic()
+
+    def _maybe_save_skip_policy(self, changed: bool):
+        # 路由直通状态变化时立即保存，否则按间隔定期保存，避免进程被强杀时丢失学习结果
+        if changed or time.monotonic() - self._last_save >= SKIP_POLICY_SAVE_INTERVAL:
+            self.save_skip_policy()
+
+    # ---------- commands ----------
+    @command.command("skippolicy.dump")
+    def skippolicy_dump(self) -> None:
+        """在日志中输出当前路由表"""
+        routes = self.skip_policy.snapshot()
+        logger.info(f"[SKIP-POLICY] threshold={self.skip_policy.threshold} routes={len(routes)}")
+        for r in routes:
+            state = "PASS" if r["passthrough"] else "SCAN"
+            logger.info(f"[SKIP-POLICY] {state} {r['host']}{r['prefix']} [{r['content_type']}] "
+                        f"seen={r['seen']} rewrites={r['rewrites']} skipped={r['skipped']} zero_streak={r['zero_streak']}")
+
+    @command.command("skippolicy.save")
+    def skippolicy_save(self) -> None:
+        """立即将路由表写入持久化文件"""
+        if not self.state_file:
+            logger.warning("[SKIP-POLICY] persistence disabled (SKIP_POLICY_STATE_FILE is empty)")
+            return
+        self.save_skip_policy()
+        logger.info(f"[SKIP-POLICY] saved to {self.state_file}")
+
+    # ---------- lifecycle hook ----------
+    def done(self):
+        # mitmproxy 退出时保存路由表
+        self.save_skip_policy()
+
     # ---------- request hook ----------
     def request(self, flow: http.HTTPFlow):
 
@@ -72,6 +126,11 @@ class TokenProxyAddon:
         if not is_text_type:
             logger.info("[RESP] 非文本类型响应，跳过")
             return
+        # 路由长期零替换则直接放行，不再解码扫描
+        route = self.skip_policy.key(host, path, content_type)
+        if self.skip_policy.should_skip(route):
+            logger.info(f"[RESP] 路由 {route} 处于直通状态，跳过")
+            return
         # 3.动态计算替换目标
         DYNAMIC_NETLOC = f"{host}:{port}"
         DYNAMIC_SCHEME = f"{scheme}"
@@ -93,7 +152,9 @@ class TokenProxyAddon:
             )
 
             # 3. 将修改后的内容写回响应
-            if rewritten_content_bytes != original_content_bytes:
+            rewritten = rewritten_content_bytes != original_content_bytes
+            self._maybe_save_skip_policy(self.skip_policy.record(route, rewritten))
+            if rewritten:
                 resp.set_content(rewritten_content_bytes)
                 logger.info(f"[REWRITE] Successfully rewrote URLs in response from {flow.request.pretty_url}")
             else:
@@ -1,7 +1,40 @@
 # mitmproxy_token_proxy/config.py
+import logging
 import os
 
 # 目标域名列表 (原始请求需要匹配的域名)
 TARGET_DOMAINS = ["192.168.0.101","192.168.0.117","192.168.0.162"]  # 当前主机域名，发出原始请求
 
 
+
+def _env_int(name: str, default: int) -> int:
+    """读取整数环境变量，取值非法时记录警告并使用默认值（避免 config 导入失败导致 addon 加载失败）"""
+    raw = os.environ.get(name)
+    if raw is None or raw.strip() == "":
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        logging.getLogger(__name__).warning(f"invalid {name}={raw!r}, fall back to {default}")
+        return default
+
+
+# --- 路由级自适应跳过策略 (skip_policy.py) ---
+# 同一 (host, 路径前缀, content-type) 连续多少次零替换后切换为直通，<= 0 关闭；可用环境变量覆盖
+# 默认关闭：路由键不含文件名，同目录下的多个 JS 共用一条路由，
+# 连续的无 URL 第三方 chunk 会让整个目录直通，需要改写的业务 chunk 在重新采样前不会被改写。
+# 确认目标站点的目录划分适合后再开启（例如 SKIP_POLICY_THRESHOLD=20）。
+SKIP_POLICY_THRESHOLD = _env_int("SKIP_POLICY_THRESHOLD", 0)
+# 直通状态下每跳过多少次放行一次重新采样
+SKIP_POLICY_RESAMPLE_EVERY = 100
+# 路由表容量上限
+SKIP_POLICY_MAX_ROUTES = 1024
+# 路由键中路径前缀保留的目录层数
+SKIP_POLICY_PATH_DEPTH = 2
+# 路由表定期保存间隔（秒）；路由切换直通/恢复扫描时会立即保存
+SKIP_POLICY_SAVE_INTERVAL = 60
+# 路由表持久化文件，可用环境变量 SKIP_POLICY_STATE_FILE 覆盖，设为空字符串则不持久化
+SKIP_POLICY_STATE_FILE = os.environ.get(
+    "SKIP_POLICY_STATE_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "skip_policy_state.json"),
+)
@@ -0,0 +1,503 @@
+# mitmproxy_token_proxy/loadtest.py
+"""
+端到端压测脚本：衡量 addon 给真实请求带来的额外延迟。
+
+流程：
+1. 在本机启动一个 asyncio 上游服务，按配置比例返回 JS/HTML/CSS/二进制响应（可选 gzip 压缩）；
+2. 分别以 "mitmdump"（不加载脚本，作为基线）和 "mitmdump -s addon.py" 两种方式挡在上游前面；
+3. 用并发客户端通过代理请求上游，统计延迟分位数、吞吐量和代理进程 RSS；
+4. 输出 addon 相对基线的 p50/p95/p99 额外延迟。
+
+注意：replacer 目前只改写 application/javascript 响应，HTML/CSS 资源不会发生替换，
+额外延迟中不包含 HTML/CSS 的改写开销。
+另外 addon 在读取 resp.content 之前就删除了 Content-Encoding，gzip 响应不会被解压和改写，
+会以"仍是 gzip 但不再带编码头"的形式交给客户端。客户端会校验每个响应体，
+按 类型/是否压缩 统计 unchanged / rewritten / undecodable 数量并写入报告，
+以免把压缩响应的延迟误读为"解压+改写"的开销。
+
+全部流量都在 127.0.0.1 上，不访问外网。
+
+用法示例：
+    python loadtest.py --requests 2000 --concurrency 32 --mix js=4,html=2,css=2,bin=1 --gzip-ratio 0.5
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import math
+import os
+import random
+import shutil
+import socket
+import subprocess
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from config import SKIP_POLICY_THRESHOLD, SKIP_POLICY_RESAMPLE_EVERY
+from logger_setup import setup_logging
+
+setup_logging(logging.INFO)
+logger = logging.getLogger(__name__)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ADDON_PATH = os.path.join(HERE, "addon.py")
+
+# 资源类型 -> Content-Type
+CONTENT_TYPES = {
+    "js": "application/javascript; charset=utf-8",
+    "html": "text/html; charset=utf-8",
+    "css": "text/css; charset=utf-8",
+    "bin": "application/octet-stream",
+}
+
+DEFAULT_MIX = "js=4,html=2,css=2,bin=1"
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+# ---------- 响应体生成 ----------
+
+def _make_text_body(kind: str, size: int, seed: int) -> bytes:
+    """
+    生成包含 URL 的文本响应体，重复片段直到达到目标大小
+    注意：process_and_rewrite_response 目前只改写 application/javascript，
+    HTML/CSS 响应体虽然含 URL 但不会被替换，对它们只测到了文本类型检查和解码的开销
+    :param kind: js / html / css
+    :param size: 目标字节数
+    :param seed: 用于让不同资源内容略有差异
+    """
+    if kind == "js":
+        chunk = (
+            f"const api{seed} = '/api/v1/items/{seed}';\n"
+            f"fetch(`/api/tasks?page={seed}`).then(r => r.json());\n"
+            f"var abs{seed} = \"http://127.0.0.1:8088/api/fake-api{seed}\";\n"
+            f"function noop{seed}(a, b) {{ return a + b * {seed}; }}\n"
+        )
+    elif kind == "html":
+        chunk = (
+            f"<div class=\"row\"><a href=\"/page/{seed}\">item {seed}</a>"
+            f"<img src=\"/static/img/{seed}.png\"><p>lorem ipsum dolor sit amet</p></div>\n"
+        )
+    else:
+        chunk = (
+            f".c{seed} {{ background-image: url('/static/bg/{seed}.png'); margin: 0 auto; }}\n"
+            f".d{seed} {{ color: #333; padding: {seed % 16}px; }}\n"
+        )
+    data = chunk.encode("utf-8")
+    repeat = max(1, size // len(data))
+    return data * repeat
+
+
+def build_catalog(mix: Dict[str, int], body_size: int, gzip_ratio: float,
+                  variants: int = 8, seed: int = 0) -> List[Tuple[str, str, bytes, bool]]:
+    """
+    预先生成上游可返回的资源列表，按 mix 中的权重重复出现，客户端均匀抽取即满足比例
+    :returns [(path, content_type, body, gzipped), ...]
+    """
+    rnd = random.Random(seed)
+    catalog = []
+    for kind, weight in mix.items():
+        if kind not in CONTENT_TYPES:
+            raise ValueError(f"unknown resource kind: {kind}")
+        for i in range(variants * weight):
+            if kind == "bin":
+                body = bytes(rnd.getrandbits(8) for _ in range(body_size))
+            else:
+                body = _make_text_body(kind, body_size, i)
+            gzipped = rnd.random() < gzip_ratio
+            if gzipped:
+                body = gzip.compress(body, compresslevel=6)
+            path = f"/{kind}/{i}{'.gz' if gzipped else ''}"
+            catalog.append((path, CONTENT_TYPES[kind], body, gzipped))
+    return catalog
+
+
+def expected_bodies(catalog) -> Dict[str, Tuple[str, bytes]]:
+    """
+    由 catalog 得到客户端校验用的期望内容
+    :returns {path: ("kind/gzip" 或 "kind/plain", 未压缩的原始响应体)}
+    """
+    expected = {}
+    for path, _, body, gzipped in catalog:
+        kind = path.split("/")[1]
+        plain = gzip.decompress(body) if gzipped else body
+        expected[path] = (f"{kind}/{'gzip' if gzipped else 'plain'}", plain)
+    return expected
+
+
+def classify_body(body: bytes, content_encoding: bytes, plain: bytes) -> str:
+    """
+    判断客户端收到的响应体属于哪种结果
+    :param body: 客户端收到的响应体
+    :param content_encoding: 响应的 Content-Encoding 头（小写，可能为空）
+    :param plain: 上游未压缩的原始响应体
+    :return: unchanged / rewritten / undecodable
+    """
+    if content_encoding == b"gzip":
+        try:
+            body = gzip.decompress(body)
+        except (OSError, EOFError):
+            return "undecodable"
+    elif content_encoding not in (b"", b"identity"):
+        return "undecodable"
+    if body == plain:
+        return "unchanged"
+    if body.startswith(GZIP_MAGIC) and not plain.startswith(GZIP_MAGIC):
+        # 仍是 gzip 数据，但编码头已被删除，浏览器无法解码
+        return "undecodable"
+    return "rewritten"
+
+
+# ---------- 本地上游 ----------
+
+class Upstream:
+    """本地 asyncio HTTP/1.1 上游，只认识 catalog 里的路径"""
+
+    def __init__(self, catalog):
+        self.routes = {path: (ct, body, gz) for path, ct, body, gz in catalog}
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.port = 0
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        self.server = await asyncio.start_server(self._handle, host, port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                request_line = head.split(b"\r\n", 1)[0].decode("latin-1")
+                parts = request_line.split(" ")
+                path = parts[1] if len(parts) > 1 else "/"
+                if not path.startswith("/"):
+                    # 绝对形式的请求目标（客户端直连上游时）
+                    path = "/" + path.split("://", 1)[-1].split("/", 1)[-1]
+                route = self.routes.get(path)
+                if route is None:
+                    writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+                else:
+                    ct, body, gz = route
+                    headers = [
+                        "HTTP/1.1 200 OK",
+                        f"Content-Type: {ct}",
+                        f"Content-Length: {len(body)}",
+                    ]
+                    if gz:
+                        headers.append("Content-Encoding: gzip")
+                    writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+# ---------- 客户端 ----------
+
+async def _read_response(reader: asyncio.StreamReader) -> Tuple[bool, bytes, bytes]:
+    """
+    读取一个完整的 HTTP/1.1 响应
+    :returns (连接是否还能复用, 响应体, Content-Encoding)
+    """
+    head = await reader.readuntil(b"\r\n\r\n")
+    headers = {}
+    for line in head.split(b"\r\n")[1:]:
+        if b":" in line:
+            k, v = line.split(b":", 1)
+            headers[k.strip().lower()] = v.strip().lower()
+
+    encoding = headers.get(b"content-encoding", b"")
+    if b"content-length" in headers:
+        body = await reader.readexactly(int(headers[b"content-length"]))
+    elif headers.get(b"transfer-encoding") == b"chunked":
+        chunks = []
+        while True:
+            size_line = await reader.readuntil(b"\r\n")
+            size = int(size_line.split(b";", 1)[0], 16)
+            chunks.append((await reader.readexactly(size + 2))[:-2])
+            if size == 0:
+                break
+        body = b"".join(chunks)
+    else:
+        # addon 删除了 Content-Length，代理可能以关闭连接作为结束
+        return False, await reader.read(), encoding
+    return headers.get(b"connection") != b"close", body, encoding
+
+
+async def _worker(proxy_port: int, upstream_port: int, paths: List[str],
+                  jobs: asyncio.Queue, latencies: List[float], errors: List[str],
+                  expected: Optional[Dict[str, Tuple[str, bytes]]], outcomes: Dict[str, Counter]):
+    reader = writer = None
+    while True:
+        try:
+            idx = jobs.get_nowait()
+        except asyncio.QueueEmpty:
+            break
+        path = paths[idx]
+        request = (
+            f"GET http://127.0.0.1:{upstream_port}{path} HTTP/1.1\r\n"
+            f"Host: 127.0.0.1:{upstream_port}\r\n"
+            f"Accept-Encoding: gzip\r\n\r\n"
+        ).encode("latin-1")
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection("127.0.0.1", proxy_port)
+            writer.write(request)
+            await writer.drain()
+            keep_alive, body, encoding = await _read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            if expected is not None and path in expected:
+                group, plain = expected[path]
+                outcomes.setdefault(group, Counter())[classify_body(body, encoding, plain)] += 1
+            if not keep_alive:
+                writer.close()
+                reader = writer = None
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+            errors.append(f"{path}: {e!r}")
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def drive(proxy_port: int, upstream_port: int, paths: List[str],
+                total: int, concurrency: int, seed: int = 0,
+                expected: Optional[Dict[str, Tuple[str, bytes]]] = None):
+    """
+    以固定并发驱动 total 个请求
+    :param expected: expected_bodies() 的结果，提供时校验每个响应体
+    :returns (latencies, errors, elapsed_seconds, outcomes)
+             outcomes: {"kind/gzip|plain": Counter(unchanged=.., rewritten=.., undecodable=..)}
+    """
+    rnd = random.Random(seed)
+    jobs = asyncio.Queue()
+    for _ in range(total):
+        jobs.put_nowait(rnd.randrange(len(paths)))
+    latencies: List[float] = []
+    errors: List[str] = []
+    outcomes: Dict[str, Counter] = {}
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        _worker(proxy_port, upstream_port, paths, jobs, latencies, errors, expected, outcomes)
+        for _ in range(concurrency)
+    ))
+    return latencies, errors, time.perf_counter() - start, outcomes
+
+
+# ---------- mitmdump 进程 ----------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def read_rss_kb(pid: int) -> Optional[int]:
+    """从 /proc 读取进程常驻内存 (KB)；非 Linux 平台返回 None"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+async def _wait_port(port: int, proc: subprocess.Popen, timeout: float = 20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"mitmdump exited early with code {proc.returncode}")
+        try:
+            _, w = await asyncio.open_connection("127.0.0.1", port)
+            w.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"mitmdump did not listen on port {port} within {timeout}s")
+
+
+async def _sample_rss(pid: int, samples: List[int], stop: asyncio.Event, interval: float = 0.2):
+    while not stop.is_set():
+        rss = read_rss_kb(pid)
+        if rss is not None:
+            samples.append(rss)
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_phase(name: str, mitmdump: str, with_addon: bool, upstream: Upstream,
+                    paths: List[str], expected: Dict[str, Tuple[str, bytes]], args) -> Dict:
+    """启动一个 mitmdump 实例并压测，返回该阶段的统计结果"""
+    port = _free_port()
+    cmd = [mitmdump, "--listen-host", "127.0.0.1", "-p", str(port), "-q",
+           "--set", "termlog_verbosity=error"]
+    if with_addon:
+        cmd += ["-s", ADDON_PATH]
+    # 压测时不读写生产路由表，保证每次运行都从空表开始、结果可复现
+    env = dict(os.environ, SKIP_POLICY_STATE_FILE="", SKIP_POLICY_THRESHOLD=str(args.skip_threshold))
+    logger.info(f"[LOADTEST] phase={name} cmd={' '.join(cmd)}")
+    proc = subprocess.Popen(cmd, cwd=HERE, env=env, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL if not args.verbose else None)
+    try:
+        await _wait_port(port, proc)
+        if args.warmup:
+            await drive(port, upstream.port, paths, args.warmup, args.concurrency, seed=args.seed + 1)
+        rss_samples: List[int] = []
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(_sample_rss(proc.pid, rss_samples, stop))
+        latencies, errors, elapsed, outcomes = await drive(
+            port, upstream.port, paths, args.requests, args.concurrency, seed=args.seed,
+            expected=expected)
+        stop.set()
+        await sampler
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+    if errors:
+        logger.warning(f"[LOADTEST] phase={name} errors={len(errors)} first={errors[0]}")
+    return {
+        "name": name,
+        "skip_threshold": args.skip_threshold if with_addon else 0,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_ms": {f"p{q}": percentile(latencies, q) * 1000 for q in (50, 95, 99)},
+        "rss_kb": {
+            "peak": max(rss_samples) if rss_samples else None,
+            "last": rss_samples[-1] if rss_samples else None,
+        },
+        "outcomes": {group: dict(counter) for group, counter in sorted(outcomes.items())},
+    }
+
+
+# ---------- 统计与报告 ----------
+
+def percentile(values: List[float], q: float) -> float:
+    """最近秩法求分位数，空列表返回 0"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, math.ceil(q / 100.0 * len(ordered)) - 1)
+    return ordered[k]
+
+
+def parse_mix(spec: str) -> Dict[str, int]:
+    """解析 "js=4,html=2" 形式的比例配置"""
+    mix = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        kind, _, weight = item.partition("=")
+        mix[kind.strip()] = int(weight or 1)
+        if mix[kind.strip()] <= 0:
+            raise ValueError(f"mix weight must be positive: {item}")
+    if not mix:
+        raise ValueError("empty --mix")
+    return mix
+
+
+def skip_policy_status(threshold: int) -> str:
+    if threshold <= 0:
+        return "disabled"
+    return (f"active (threshold={threshold}, resample every {SKIP_POLICY_RESAMPLE_EVERY}, "
+            f"state not persisted)")
+
+
+def format_report(baseline: Dict, addon: Dict) -> str:
+    lines = [
+        f"{'phase':<10}{'reqs':>8}{'errs':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'peak RSS MB':>14}",
+    ]
+    for r in (baseline, addon):
+        peak = r["rss_kb"]["peak"]
+        lines.append(
+            f"{r['name']:<10}{r['requests']:>8}{r['errors']:>6}{r['throughput_rps']:>10.1f}"
+            f"{r['latency_ms']['p50']:>10.2f}{r['latency_ms']['p95']:>10.2f}{r['latency_ms']['p99']:>10.2f}"
+            f"{(peak / 1024 if peak else float('nan')):>14.1f}"
+        )
+    added = {q: addon["latency_ms"][q] - baseline["latency_ms"][q] for q in ("p50", "p95", "p99")}
+    lines.append(
+        f"added latency: p50={added['p50']:+.2f}ms p95={added['p95']:+.2f}ms p99={added['p99']:+.2f}ms"
+    )
+    if baseline["throughput_rps"]:
+        ratio = addon["throughput_rps"] / baseline["throughput_rps"]
+        lines.append(f"throughput ratio (addon/baseline): {ratio:.2f}")
+    if baseline["rss_kb"]["peak"] and addon["rss_kb"]["peak"]:
+        delta = (addon["rss_kb"]["peak"] - baseline["rss_kb"]["peak"]) / 1024
+        lines.append(f"peak RSS delta: {delta:+.1f} MB")
+    lines.append("response bodies (unchanged / rewritten / undecodable):")
+    groups = sorted(set(baseline.get("outcomes", {})) | set(addon.get("outcomes", {})))
+    for group in groups:
+        cells = []
+        for r in (baseline, addon):
+            c = r.get("outcomes", {}).get(group, {})
+            cells.append(f"{r['name']} {c.get('unchanged', 0)}/{c.get('rewritten', 0)}/{c.get('undecodable', 0)}")
+        lines.append(f"  {group:<12}" + "   ".join(cells))
+    lines.append(f"skip policy: {skip_policy_status(addon.get('skip_threshold', 0))}")
+    lines.append("note: only application/javascript responses are rewritten; html/css measure the text-type check only")
+    return "\n".join(lines)
+
+
+async def main_async(args) -> Dict:
+    mitmdump = args.mitmdump or shutil.which("mitmdump")
+    if not mitmdump:
+        raise SystemExit("mitmdump not found; install mitmproxy or pass --mitmdump")
+
+    catalog = build_catalog(parse_mix(args.mix), args.body_kb * 1024, args.gzip_ratio, seed=args.seed)
+    paths = [p for p, _, _, _ in catalog]
+    expected = expected_bodies(catalog)
+    upstream = Upstream(catalog)
+    await upstream.start()
+    logger.info(f"[LOADTEST] upstream on 127.0.0.1:{upstream.port}, {len(catalog)} resources")
+    try:
+        baseline = await run_phase("baseline", mitmdump, False, upstream, paths, expected, args)
+        addon = await run_phase("addon", mitmdump, True, upstream, paths, expected, args)
+    finally:
+        await upstream.stop()
+
+    print(format_report(baseline, addon))
+    report = {"config": vars(args), "baseline": baseline, "addon": addon}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="addon 端到端压测（仅本机）")
+    p.add_argument("--requests", type=int, default=1000, help="每个阶段的请求数")
+    p.add_argument("--warmup", type=int, default=100, help="每个阶段的预热请求数（不计入统计）")
+    p.add_argument("--concurrency", type=int, default=16, help="并发客户端连接数")
+    p.add_argument("--mix", default=DEFAULT_MIX, help="资源比例，例如 js=4,html=2,css=2,bin=1")
+    p.add_argument("--gzip-ratio", type=float, default=0.5, help="gzip 压缩响应所占比例 0~1")
+    p.add_argument("--body-kb", type=int, default=32, help="单个响应体（压缩前）大小 KB")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--skip-threshold", type=int, default=SKIP_POLICY_THRESHOLD,
+                   help="addon 路由跳过策略阈值，<= 0 关闭（压测时路由表不持久化）")
+    p.add_argument("--mitmdump", default=None, help="mitmdump 可执行文件路径，默认从 PATH 查找")
+    p.add_argument("--json", default=None, help="将完整报告写入该 JSON 文件")
+    p.add_argument("--verbose", action="store_true", help="显示 mitmdump 的 stderr")
+    return p.parse_args(argv)
+
+
+if __name__ == '__main__':
+    asyncio.run(main_async(parse_args()))
@@ -0,0 +1,240 @@
+# mitmproxy_token_proxy/skip_policy.py
+"""
+按路由自适应跳过策略。
+
+很多通过文本类型检查的路由（JSON 接口、第三方 CSS 等）从来不包含可替换的 URL，
+但每次仍然要解码、扫描。这里按 (host, 路径前缀, content-type) 记录替换结果：
+连续 N 次零替换后该路由切换为直通，之后每跳过 M 次放行一次重新采样，
+一旦采样到替换就恢复正常处理。
+
+路由表有容量上限（LRU 淘汰），可通过 snapshot() 查看，并可保存到 JSON 文件跨重启复用。
+"""
+import json
+import logging
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from logger_setup import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+RouteKey = Tuple[str, str, str]
+
+STATE_VERSION = 1
+
+
+def route_key(host: str, path: str, content_type: str, depth: int = 2) -> RouteKey:
+    """
+    计算路由键
+    :param host: 请求主机
+    :param path: 请求路径（可带查询串）
+    :param content_type: 响应 Content-Type，参数部分（charset 等）会被去掉
+    :param depth: 路径前缀保留的目录层数；最后一段视为文件名，不参与前缀
+    :return: (host, 路径前缀, content-type)
+    """
+    path = (path or "/").split("?", 1)[0].split("#", 1)[0]
+    segments = [s for s in path.split("/") if s]
+    if segments and not path.endswith("/"):
+        segments = segments[:-1]
+    prefix = "/" + "/".join(segments[:depth])
+    ct = (content_type or "").split(";", 1)[0].strip().lower()
+    return (host or "").lower(), prefix, ct
+
+
+class _RouteStats:
+    __slots__ = ("zero_streak", "passthrough", "skipped_since_sample",
+                 "seen", "rewrites", "skipped")
+
+    def __init__(self):
+        self.zero_streak = 0           # 连续零替换次数
+        self.passthrough = False       # 是否处于直通状态
+        self.skipped_since_sample = 0  # 上次采样后跳过的次数
+        self.seen = 0                  # 实际处理（扫描）过的响应数
+        self.rewrites = 0              # 发生替换的响应数
+        self.skipped = 0               # 直通跳过的响应数
+
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "_RouteStats":
+        """类型不符的字段直接报 ValueError，不做强制转换（"false" 不能被当成 True）"""
+        stats = cls()
+        for name in cls.__slots__:
+            if name not in data:
+                continue
+            value = data[name]
+            if isinstance(getattr(stats, name), bool):
+                ok = isinstance(value, bool)
+            else:
+                ok = isinstance(value, int) and not isinstance(value, bool) and value >= 0
+            if not ok:
+                raise ValueError(f"invalid value for {name}: {value!r}")
+            setattr(stats, name, value)
+        return stats
+
+
+class RouteSkipPolicy:
+    """
+    路由级跳过策略，线程安全
+
+    用法：
+        key = policy.key(host, path, content_type)
+        if policy.should_skip(key):
+            return
+        ...扫描/替换...
+        policy.record(key, rewritten)
+    """
+
+    def __init__(self, threshold: int = 20, resample_every: int = 100,
+                 max_routes: int = 1024, path_depth: int = 2):
+        """
+        :param threshold: 连续零替换多少次后切换为直通，<= 0 表示关闭策略
+        :param resample_every: 直通状态下每跳过多少次放行一次重新采样
+        :param max_routes: 路由表容量上限，超出时淘汰最久未使用的路由
+        :param path_depth: 路由键中路径前缀保留的目录层数
+        """
+        self.threshold = threshold
+        self.resample_every = max(1, resample_every)
+        self.max_routes = max(1, max_routes)
+        self.path_depth = path_depth
+        self._routes: "OrderedDict[RouteKey, _RouteStats]" = OrderedDict()
+        self._lock = Lock()
+
+    def key(self, host: str, path: str, content_type: str) -> RouteKey:
+        return route_key(host, path, content_type, self.path_depth)
+
+    def _get(self, key: RouteKey) -> _RouteStats:
+        # 调用方需持有锁
+        stats = self._routes.get(key)
+        if stats is None:
+            stats = _RouteStats()
+            self._routes[key] = stats
+            while len(self._routes) > self.max_routes:
+                evicted, _ = self._routes.popitem(last=False)
+                logger.debug(f"[SKIP-POLICY] evict route {evicted}")
+        else:
+            self._routes.move_to_end(key)
+        return stats
+
+    def should_skip(self, key: RouteKey) -> bool:
+        """
+        判断该路由本次是否直接放行（不解码、不扫描）
+        直通状态下每 resample_every 次返回一次 False 作为重新采样
+        """
+        if self.threshold <= 0:
+            return False
+        with self._lock:
+            stats = self._get(key)
+            if not stats.passthrough:
+                return False
+            if stats.skipped_since_sample >= self.resample_every:
+                stats.skipped_since_sample = 0
+                return False
+            stats.skipped_since_sample += 1
+            stats.skipped += 1
+            return True
+
+    def record(self, key: RouteKey, rewritten: bool) -> bool:
+        """
+        记录一次实际处理的结果
+        :param rewritten: 本次响应是否发生了替换
+        :return: 该路由的直通状态是否因此发生变化
+        """
+        if self.threshold <= 0:
+            return False
+        with self._lock:
+            stats = self._get(key)
+            stats.seen += 1
+            if rewritten:
+                stats.rewrites += 1
+                stats.zero_streak = 0
+                changed = stats.passthrough
+                if changed:
+                    logger.info(f"[SKIP-POLICY] route {key} rewritten again, resume scanning")
+                stats.passthrough = False
+                stats.skipped_since_sample = 0
+                return changed
+            stats.zero_streak += 1
+            if not stats.passthrough and stats.zero_streak >= self.threshold:
+                stats.passthrough = True
+                stats.skipped_since_sample = 0
+                logger.info(f"[SKIP-POLICY] route {key} had {stats.zero_streak} zero-rewrite responses, switch to pass-through")
+                return True
+            return False
+
+    def snapshot(self) -> List[Dict]:
+        """返回当前路由表的副本，按最近使用排序（最新在后）"""
+        with self._lock:
+            return [
+                {"host": k[0], "prefix": k[1], "content_type": k[2], **v.to_dict()}
+                for k, v in self._routes.items()
+            ]
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+
+    # ---------- 持久化 ----------
+
+    def save(self, path: str):
+        """将路由表写入 JSON 文件（先写临时文件再替换，避免写一半）"""
+        data = {"version": STATE_VERSION, "routes": self.snapshot()}
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+
+    def load(self, path: str) -> bool:
+        """
+        从 JSON 文件恢复路由表；文件不存在时不做任何改动，格式不对时回退为空表
+        直通状态按当前阈值重新计算（阈值调整后旧的直通判断不再沿用），采样计数清零
+        :return: 是否成功加载
+        """
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if not isinstance(data, dict) or data.get("version") != STATE_VERSION:
+                raise ValueError("top level must be an object with a supported version")
+            items = data.get("routes", [])
+            if not isinstance(items, list):
+                raise ValueError("routes must be a list")
+            routes = OrderedDict()
+            for item in items:
+                if not isinstance(item, dict):
+                    raise ValueError(f"route entry must be an object: {item!r}")
+                key = (item.get("host"), item.get("prefix"), item.get("content_type"))
+                if not all(isinstance(k, str) for k in key):
+                    raise ValueError(f"invalid route key: {key!r}")
+                stats = _RouteStats.from_dict(item)
+                stats.passthrough = 0 < self.threshold <= stats.zero_streak
+                stats.skipped_since_sample = 0
+                routes[key] = stats
+        except (OSError, ValueError):
+            logger.exception(f"[SKIP-POLICY] failed to load state file {path}, start with an empty table")
+            self.clear()
+            return False
+        with self._lock:
+            self._routes = routes
+            while len(self._routes) > self.max_routes:
+                self._routes.popitem(last=False)
+        return True
+
+
+if __name__ == '__main__':
+    # 查看已保存的路由表: python skip_policy.py skip_policy_state.json
+    import sys
+
+    policy = RouteSkipPolicy(max_routes=1 << 30)
+    if len(sys.argv) < 2 or not policy.load(sys.argv[1]):
+        print("usage: python skip_policy.py <state.json>")
+        sys.exit(1)
+    for r in policy.snapshot():
+        state = "PASS" if r["passthrough"] else "SCAN"
+        print(f"{state} {r['host']}{r['prefix']} [{r['content_type']}] "
+              f"seen={r['seen']} rewrites={r['rewrites']} skipped={r['skipped']} zero_streak={r['zero_streak']}")
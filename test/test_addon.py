@@ -0,0 +1,51 @@
+# test_addon.py
+
+import unittest
+
+try:
+    from mitmproxy import http
+    from mitmproxy.test import tflow
+    from addon import TokenProxyAddon
+    HAS_MITMPROXY = True
+except ImportError:
+    HAS_MITMPROXY = False
+
+from skip_policy import RouteSkipPolicy
+
+# 确保 logger 不会干扰测试输出
+import logging
+
+logging.disable(logging.CRITICAL)
+
+VENDOR_JS = b"function f(a, b) { return a + b; }"
+APP_JS = b"const api = '/api/tasks';"
+
+
+@unittest.skipUnless(HAS_MITMPROXY, "mitmproxy is not installed")
+class TestAddonSkipPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = RouteSkipPolicy(threshold=2, resample_every=3)
+        self.addon = TokenProxyAddon(skip_policy=self.policy, state_file="")
+
+    def _respond(self, name: str, body: bytes) -> bytes:
+        flow = tflow.tflow()
+        flow.request.host = "example.com"
+        flow.request.port = 8080
+        flow.request.path = f"/static/js/{name}"
+        flow.response = http.Response.make(200, body, {"Content-Type": "application/javascript"})
+        self.addon.response(flow)
+        return flow.response.content
+
+    def test_resample_rewrite_resumes_scanning_for_shared_prefix(self):
+        # 两个不含 URL 的第三方 chunk 让 /static/js 整个前缀直通
+        self._respond("vendor.1.js", VENDOR_JS)
+        self._respond("vendor.2.js", VENDOR_JS)
+        self.assertTrue(self.policy.snapshot()[0]["passthrough"])
+        # 直通期间业务 chunk 原样返回（这正是默认关闭策略的原因）
+        for i in range(3):
+            self.assertEqual(self._respond(f"app.{i}.js", APP_JS), APP_JS)
+        # 重新采样时发现替换，恢复扫描
+        self.assertIn(b"http://example.com:8080/api/tasks", self._respond("app.3.js", APP_JS))
+        self.assertFalse(self.policy.snapshot()[0]["passthrough"])
+        self.assertIn(b"http://example.com:8080/api/tasks", self._respond("app.4.js", APP_JS))
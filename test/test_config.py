@@ -0,0 +1,35 @@
+# test_config.py
+
+import importlib
+import os
+import unittest
+from unittest import mock
+
+import config
+
+# 确保 logger 不会干扰测试输出
+import logging
+
+logging.disable(logging.CRITICAL)
+
+
+class TestSkipPolicyEnv(unittest.TestCase):
+
+    def tearDown(self):
+        importlib.reload(config)
+
+    def _reload_with(self, **env):
+        with mock.patch.dict(os.environ, env):
+            return importlib.reload(config)
+
+    def test_threshold_from_env(self):
+        self.assertEqual(self._reload_with(SKIP_POLICY_THRESHOLD="25").SKIP_POLICY_THRESHOLD, 25)
+
+    def test_invalid_threshold_falls_back_to_default(self):
+        # 非法值不能让 config（以及 star-import 它的 addon）导入失败
+        self.assertEqual(self._reload_with(SKIP_POLICY_THRESHOLD="twenty").SKIP_POLICY_THRESHOLD, 0)
+        self.assertEqual(self._reload_with(SKIP_POLICY_THRESHOLD="").SKIP_POLICY_THRESHOLD, 0)
+
+    def test_state_file_override(self):
+        self.assertEqual(self._reload_with(SKIP_POLICY_STATE_FILE="").SKIP_POLICY_STATE_FILE, "")
+        self.assertEqual(self._reload_with(SKIP_POLICY_STATE_FILE="/tmp/s.json").SKIP_POLICY_STATE_FILE, "/tmp/s.json")
@@ -0,0 +1,116 @@
+# test_loadtest.py
+
+import gzip
+import unittest
+import asyncio
+from loadtest import (percentile, parse_mix, build_catalog, expected_bodies, classify_body,
+                      drive, Upstream, CONTENT_TYPES)
+
+# 确保 logger 不会干扰测试输出
+import logging
+
+logging.disable(logging.CRITICAL)
+
+
+class TestPercentile(unittest.TestCase):
+
+    def test_empty(self):
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_known_answers_n10(self):
+        values = list(range(10, 0, -1))  # 乱序输入 1..10
+        self.assertEqual(percentile(values, 50), 5)
+        self.assertEqual(percentile(values, 95), 10)
+        self.assertEqual(percentile(values, 99), 10)
+        self.assertEqual(percentile(values, 0), 1)
+
+    def test_known_answers_n100(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile(values, 100), 100)
+
+
+class TestParseMix(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual(parse_mix("js=4, html=2,css=2,bin=1"), {"js": 4, "html": 2, "css": 2, "bin": 1})
+        # 省略权重默认为 1，空项被忽略
+        self.assertEqual(parse_mix("js,,css=3"), {"js": 1, "css": 3})
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            parse_mix("")
+        with self.assertRaises(ValueError):
+            parse_mix("js=abc")
+        # 权重为 0 或负数会得到空 catalog，必须直接拒绝
+        for spec in ("js=0", "js=0,css=0", "js=-1", "js=2,css=0"):
+            with self.assertRaises(ValueError):
+                parse_mix(spec)
+
+
+class TestBuildCatalog(unittest.TestCase):
+
+    def test_mix_weights_and_content_types(self):
+        catalog = build_catalog({"js": 3, "css": 1}, 512, 0.0, variants=4)
+        kinds = [path.split("/")[1] for path, _, _, _ in catalog]
+        self.assertEqual(kinds.count("js"), 12)
+        self.assertEqual(kinds.count("css"), 4)
+        for path, ct, body, gzipped in catalog:
+            self.assertEqual(ct, CONTENT_TYPES[path.split("/")[1]])
+            self.assertFalse(gzipped)
+            self.assertGreaterEqual(len(body), 256)
+        self.assertEqual(len({path for path, _, _, _ in catalog}), len(catalog))
+
+    def test_gzip_ratio(self):
+        self.assertTrue(all(gz for _, _, _, gz in build_catalog({"html": 2}, 256, 1.0)))
+        catalog = build_catalog({"js": 10, "bin": 10}, 256, 0.5, variants=10)
+        ratio = sum(gz for _, _, _, gz in catalog) / len(catalog)
+        self.assertTrue(0.3 < ratio < 0.7, ratio)
+        for path, _, body, gzipped in catalog:
+            if gzipped:
+                self.assertTrue(path.endswith(".gz"))
+                gzip.decompress(body)
+
+    def test_unknown_kind(self):
+        with self.assertRaises(ValueError):
+            build_catalog({"png": 1}, 256, 0.0)
+
+
+class TestClassifyBody(unittest.TestCase):
+    PLAIN = b"const a = '/api/v1';"
+
+    def test_unchanged_and_rewritten(self):
+        self.assertEqual(classify_body(self.PLAIN, b"", self.PLAIN), "unchanged")
+        self.assertEqual(classify_body(gzip.compress(self.PLAIN), b"gzip", self.PLAIN), "unchanged")
+        self.assertEqual(classify_body(b"const a = 'http://h:1/api/v1';", b"", self.PLAIN), "rewritten")
+
+    def test_undecodable(self):
+        # gzip 数据但编码头已被删除
+        self.assertEqual(classify_body(gzip.compress(self.PLAIN), b"", self.PLAIN), "undecodable")
+        # 声称 gzip 但内容不是 gzip
+        self.assertEqual(classify_body(self.PLAIN, b"gzip", self.PLAIN), "undecodable")
+        self.assertEqual(classify_body(self.PLAIN, b"br", self.PLAIN), "undecodable")
+
+
+class TestDriveDirect(unittest.TestCase):
+
+    def test_direct_upstream_bodies_unchanged(self):
+        # 客户端直连本地上游（无代理）：所有响应体都应原样返回
+        async def run():
+            catalog = build_catalog({"js": 1, "bin": 1}, 512, 0.5, variants=4)
+            upstream = Upstream(catalog)
+            await upstream.start()
+            try:
+                return await drive(upstream.port, upstream.port, [p for p, _, _, _ in catalog],
+                                   50, 4, expected=expected_bodies(catalog))
+            finally:
+                await upstream.stop()
+
+        latencies, errors, _, outcomes = asyncio.run(run())
+        self.assertEqual(errors, [])
+        self.assertEqual(len(latencies), 50)
+        self.assertEqual(sum(sum(c.values()) for c in outcomes.values()), 50)
+        for counter in outcomes.values():
+            self.assertEqual(set(counter), {"unchanged"})
@@ -0,0 +1,149 @@
+# test_skip_policy.py
+
+import json
+import os
+import tempfile
+import unittest
+from skip_policy import RouteSkipPolicy, route_key
+
+# 确保 logger 不会干扰测试输出
+import logging
+
+logging.disable(logging.CRITICAL)
+
+
+class TestRouteKey(unittest.TestCase):
+
+    def test_prefix_and_content_type_normalization(self):
+        # 最后一段视为文件名，查询串和 content-type 参数被去掉
+        self.assertEqual(
+            route_key("API.Example.com", "/api/v1/users/42?x=1", "application/json; charset=utf-8"),
+            ("api.example.com", "/api/v1", "application/json"),
+        )
+        self.assertEqual(route_key("h", "/static/app.js", "text/css"), ("h", "/static", "text/css"))
+        self.assertEqual(route_key("h", "/", "text/html"), ("h", "/", "text/html"))
+        self.assertEqual(route_key("h", "/a/b/", "text/html", depth=1), ("h", "/a", "text/html"))
+
+
+class TestRouteSkipPolicy(unittest.TestCase):
+    KEY = ("example.com", "/api/v1", "application/json")
+
+    def _feed_zero(self, policy, n):
+        for _ in range(n):
+            self.assertFalse(policy.should_skip(self.KEY))
+            policy.record(self.KEY, False)
+
+    def test_switch_to_passthrough_after_threshold(self):
+        policy = RouteSkipPolicy(threshold=3, resample_every=100)
+        self._feed_zero(policy, 3)
+        self.assertTrue(policy.should_skip(self.KEY))
+
+    def test_rewrite_resets_streak(self):
+        policy = RouteSkipPolicy(threshold=3, resample_every=100)
+        self._feed_zero(policy, 2)
+        policy.record(self.KEY, True)
+        self._feed_zero(policy, 2)
+        self.assertFalse(policy.should_skip(self.KEY))
+
+    def test_resample_and_recover(self):
+        policy = RouteSkipPolicy(threshold=2, resample_every=3)
+        self._feed_zero(policy, 2)
+        # 跳过 3 次后放行一次采样
+        self.assertEqual([policy.should_skip(self.KEY) for _ in range(4)], [True, True, True, False])
+        # 采样仍为零替换：继续直通
+        policy.record(self.KEY, False)
+        self.assertTrue(policy.should_skip(self.KEY))
+        # 采样发现替换：恢复扫描
+        for _ in range(2):
+            policy.should_skip(self.KEY)
+        self.assertFalse(policy.should_skip(self.KEY))
+        policy.record(self.KEY, True)
+        self.assertFalse(policy.should_skip(self.KEY))
+
+    def test_disabled_policy_never_skips(self):
+        policy = RouteSkipPolicy(threshold=0)
+        for _ in range(10):
+            policy.record(self.KEY, False)
+        self.assertFalse(policy.should_skip(self.KEY))
+        self.assertEqual(policy.snapshot(), [])
+
+    def test_bounded_lru(self):
+        policy = RouteSkipPolicy(threshold=1, max_routes=2)
+        policy.record(("a", "/", "text/css"), False)
+        policy.record(("b", "/", "text/css"), False)
+        policy.should_skip(("a", "/", "text/css"))  # a 变为最近使用
+        policy.record(("c", "/", "text/css"), False)
+        hosts = [r["host"] for r in policy.snapshot()]
+        self.assertEqual(hosts, ["a", "c"])
+
+    def test_save_and_load(self):
+        policy = RouteSkipPolicy(threshold=2)
+        self._feed_zero(policy, 2)
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "state.json")
+            policy.save(path)
+            restored = RouteSkipPolicy(threshold=2)
+            self.assertTrue(restored.load(path))
+        self.assertEqual(restored.snapshot(), policy.snapshot())
+        self.assertTrue(restored.should_skip(self.KEY))
+
+    def test_load_missing_or_corrupt_file(self):
+        policy = RouteSkipPolicy()
+        self.assertFalse(policy.load("/nonexistent/state.json"))
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "state.json")
+            with open(path, "w") as f:
+                f.write("{not json")
+            self.assertFalse(policy.load(path))
+        self.assertEqual(policy.snapshot(), [])
+
+    def test_load_non_object_file(self):
+        policy = RouteSkipPolicy(threshold=1)
+        policy.record(self.KEY, False)
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "state.json")
+            for content in ("[]", "42", '{"version": 1, "routes": [[]]}', '{"version": 1, "routes": {}}'):
+                with open(path, "w") as f:
+                    f.write(content)
+                self.assertFalse(policy.load(path))
+                self.assertEqual(policy.snapshot(), [])
+
+    def test_load_wrongly_typed_field(self):
+        policy = RouteSkipPolicy(threshold=2)
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "state.json")
+            for bad in ({"passthrough": "false"}, {"zero_streak": "5"}, {"seen": True}, {"host": 1}):
+                item = {"host": "example.com", "prefix": "/api/v1", "content_type": "application/json",
+                        "passthrough": False, "zero_streak": 0}
+                item.update(bad)
+                with open(path, "w") as f:
+                    json.dump({"version": 1, "routes": [item]}, f)
+                self.assertFalse(policy.load(path))
+                self.assertEqual(policy.snapshot(), [])
+                self.assertFalse(policy.should_skip(self.KEY))
+
+    def test_record_reports_state_change(self):
+        policy = RouteSkipPolicy(threshold=2, resample_every=1)
+        self.assertFalse(policy.record(self.KEY, False))
+        self.assertTrue(policy.record(self.KEY, False))   # 切换为直通
+        self.assertFalse(policy.record(self.KEY, False))
+        self.assertTrue(policy.record(self.KEY, True))    # 恢复扫描
+        self.assertFalse(policy.record(self.KEY, True))
+
+    def test_reload_with_higher_threshold_scans_again(self):
+        policy = RouteSkipPolicy(threshold=2, resample_every=5)
+        self._feed_zero(policy, 2)
+        policy.should_skip(self.KEY)
+        self.assertTrue(policy.should_skip(self.KEY))
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "state.json")
+            policy.save(path)
+            stricter = RouteSkipPolicy(threshold=200, resample_every=5)
+            self.assertTrue(stricter.load(path))
+            same = RouteSkipPolicy(threshold=2, resample_every=5)
+            self.assertTrue(same.load(path))
+        self.assertFalse(stricter.should_skip(self.KEY))
+        self.assertFalse(stricter.snapshot()[0]["passthrough"])
+        # 阈值不变时仍为直通，但采样计数已清零
+        self.assertEqual(same.snapshot()[0]["skipped_since_sample"], 0)
+        self.assertTrue(same.should_skip(self.KEY))